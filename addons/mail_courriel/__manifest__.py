@@ -11,6 +11,9 @@
         - Réception des emails via IMAP
         - Gestion des dossiers (Boîte de réception, Envoyés, Brouillons, Archives, Spam)
         - Étiquettes personnalisables (Urgent, RH, Facture, Client, Interne)
+        - Règles de classement automatique des courriels entrants
+        - Classifieur local (spam, priorité) entraîné sur les choix des utilisateurs
+        - Import et export de boîtes mbox/EML en flux
         - Suivi des statuts (brouillon, envoyé, lu, archivé)
         - Gestion des priorités
         - Pièces jointes
@@ -25,9 +28,13 @@
         "security/ir.model.access.csv",
         "data/mail_dossier_data.xml",
         "data/mail_etiquette_data.xml",
+        "data/mail_classifieur_data.xml",
+        "data/mail_synchro_data.xml",
         "views/mail_courriel_views.xml",
         "views/mail_dossier_views.xml",
         "views/mail_etiquette_views.xml",
+        "views/mail_regle_views.xml",
+        "views/mail_classifieur_views.xml",
         "views/mail_client_action.xml",
         "views/menu_views.xml",
     ],
@@ -0,0 +1,44 @@
+import json
+import odoo
+from odoo import api, http
+from odoo.http import request, content_disposition
+from werkzeug.exceptions import BadRequest
+
+
+class MailCourrielController(http.Controller):
+
+    @http.route("/mail_courriel/export_mbox", type="http", auth="user")
+    def export_mbox(self, export_id=None, ids=None, domain=None, **kwargs):
+        """
+        Téléchargement mbox des courriels désignés par un export préparé
+        (export_id, voir action_exporter_mbox), par leurs identifiants
+        (ids=1,2,3) ou par un domaine JSON, envoyé au fil de l'eau.
+        """
+        try:
+            if export_id:
+                export = request.env["mail.courriel.export"].browse(int(export_id)).exists()
+                if not export:
+                    raise ValueError(export_id)
+                domaine = export.domaine
+            elif ids:
+                domaine = [("id", "in", [int(i) for i in ids.split(",")])]
+            else:
+                domaine = json.loads(domain or "[]")
+            if not isinstance(domaine, list):
+                raise ValueError(domaine)
+            # Valider le domaine avant de commencer l'envoi
+            request.env["mail.courriel"].search_count(domaine, limit=1)
+        except (ValueError, TypeError):
+            raise BadRequest("Paramètre export_id, ids ou domain invalide.")
+        flux = self._flux_mbox(request.db, request.env.uid, dict(request.env.context), domaine)
+        return request.make_response(flux, headers=[
+            ("Content-Type", "application/mbox"),
+            ("Content-Disposition", content_disposition("courriels.mbox")),
+        ])
+
+    def _flux_mbox(self, dbname, uid, context, domaine):
+        # Le curseur de la requête est fermé pendant l'envoi de la réponse :
+        # le générateur ouvre le sien
+        with odoo.registry(dbname).cursor() as cr:
+            env = api.Environment(cr, uid, context)
+            yield from env["mail.courriel"]._generer_mbox(domaine)
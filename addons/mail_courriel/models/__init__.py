@@ -2,3 +2,7 @@ from . import mail_courriel
 from . import mail_dossier
 from . import mail_etiquette
 from . import mail_ai
+from . import mail_regle
+from . import mail_classifieur
+from . import mail_synchro
+from . import mail_mbox
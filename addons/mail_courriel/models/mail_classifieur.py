@@ -0,0 +1,360 @@
+import base64
+import math
+import re
+import zlib
+from array import array
+from collections import Counter
+from odoo import models, fields, api, tools
+from odoo.exceptions import ValidationError
+
+MOT_RE = re.compile(r'\w{2,}')
+BALISE_RE = re.compile(r'<[^>]+>')
+
+# Hachage des caractéristiques : 2^16 compteurs par classe
+NB_BITS = 16
+NB_CASES = 1 << NB_BITS
+MASQUE_CASES = NB_CASES - 1
+
+# Longueur maximale de contenu analysée par courriel
+LONGUEUR_CONTENU = 10000
+
+# Type de compteur à taille fixe (8 octets) : les données restent lisibles quelle que soit la plateforme
+TYPE_COMPTEUR = 'q'
+
+# Champs dont la modification invalide le modèle en cache
+CHAMPS_MODELE = {"actif", "seuil", "min_exemples", "compteurs", "documents"}
+
+CLASSES = {
+    "spam": ["ham", "spam"],
+    "priorite": ["0", "1", "2", "3"],
+}
+
+
+def _caracteristiques(objet, expediteur, contenu):
+    """
+    Transforme un courriel en indices de caractéristiques hachées.
+    crc32 est stable d'un processus à l'autre, contrairement à hash().
+    """
+    texte = BALISE_RE.sub(' ', (contenu or '')[:LONGUEUR_CONTENU])
+    tokens = ['o:' + mot for mot in MOT_RE.findall((objet or '').lower())]
+    tokens += MOT_RE.findall(texte.lower())
+    domaine = (expediteur or '').lower().rpartition('@')[2].strip('> ')
+    if domaine:
+        tokens.append('d:' + domaine)
+    return [zlib.crc32(token.encode()) & MASQUE_CASES for token in tokens]
+
+
+class ModeleBayes:
+    """
+    Classifieur bayésien naïf multinomial sur caractéristiques hachées.
+    Les log-vraisemblances sont précalculées : classer un courriel revient
+    à une somme de lectures de tableau par mot. Le modèle n'est utilisé
+    qu'à partir de `min_exemples` exemples appris dans chaque classe.
+    """
+
+    def __init__(self, classes, documents, compteurs, min_exemples):
+        self.classes = classes
+        total_documents = sum(documents.get(c, 0) for c in classes)
+        self.pret = all(documents.get(c, 0) >= min_exemples for c in classes)
+        self.log_a_priori = []
+        self.log_vraisemblances = []
+        for position, classe in enumerate(classes):
+            tranche = compteurs[position * NB_CASES:(position + 1) * NB_CASES]
+            denominateur = math.log(sum(tranche) + NB_CASES)
+            self.log_a_priori.append(
+                math.log((documents.get(classe, 0) + 1) / (total_documents + len(classes)))
+            )
+            self.log_vraisemblances.append(
+                array('d', (math.log(n + 1) - denominateur for n in tranche))
+            )
+
+    def probabilites(self, indices):
+        scores = [
+            a_priori + sum(vraisemblances[i] for i in indices)
+            for a_priori, vraisemblances in zip(self.log_a_priori, self.log_vraisemblances)
+        ]
+        maximum = max(scores)
+        exps = [math.exp(s - maximum) for s in scores]
+        total = sum(exps)
+        return {classe: e / total for classe, e in zip(self.classes, exps)}
+
+
+class MailClassifieur(models.Model):
+    _name = "mail.classifieur"
+    _description = "Classifieur local des courriels"
+    _order = "code"
+
+    name = fields.Char(
+        string="Nom",
+        required=True
+    )
+
+    code = fields.Selection([
+        ("spam", "Spam"),
+        ("priorite", "Priorité"),
+    ], string="Code", required=True)
+
+    actif = fields.Boolean(
+        string="Classement automatique",
+        default=True,
+        help="Appliquer le classifieur aux courriels entrants"
+    )
+
+    seuil = fields.Float(
+        string="Seuil de confiance",
+        default=0.95,
+        help="Probabilité minimale pour classer automatiquement un courriel (entre 0,5 et 1)"
+    )
+
+    min_exemples = fields.Integer(
+        string="Exemples minimum par classe",
+        default=50,
+        help="Nombre d'exemples appris requis dans chaque classe avant tout classement automatique"
+    )
+
+    documents = fields.Json(
+        string="Documents par classe",
+        readonly=True
+    )
+
+    compteurs = fields.Binary(
+        string="Compteurs",
+        attachment=True,
+        readonly=True
+    )
+
+    nb_documents = fields.Integer(
+        string="Exemples appris",
+        compute="_compute_nb_documents"
+    )
+
+    date_entrainement = fields.Datetime(
+        string="Dernier entraînement",
+        readonly=True
+    )
+
+    _sql_constraints = [
+        ("code_unique", "unique(code)", "Un seul classifieur par code !")
+    ]
+
+    @api.constrains("seuil", "min_exemples")
+    def _check_parametres(self):
+        for classifieur in self:
+            if not 0.5 <= classifieur.seuil <= 1:
+                raise ValidationError("Le seuil de confiance doit être compris entre 0,5 et 1.")
+            if classifieur.min_exemples < 1:
+                raise ValidationError("Il faut au moins un exemple par classe.")
+
+    @api.depends("documents")
+    def _compute_nb_documents(self):
+        for classifieur in self:
+            classifieur.nb_documents = sum((classifieur.documents or {}).values())
+
+    def _lire_compteurs(self):
+        self.ensure_one()
+        compteurs = array(TYPE_COMPTEUR)
+        if self.compteurs:
+            compteurs.frombytes(zlib.decompress(base64.b64decode(self.compteurs)))
+        else:
+            compteurs.extend([0] * (NB_CASES * len(CLASSES[self.code])))
+        return compteurs
+
+    @api.model
+    @tools.ormcache("code")
+    def _get_modele(self, code):
+        """Charge le modèle en mémoire, une fois par base de données"""
+        classifieur = self.sudo().search([("code", "=", code)], limit=1)
+        if not classifieur or not classifieur.actif:
+            return None
+        modele = ModeleBayes(
+            CLASSES[code], classifieur.documents or {}, classifieur._lire_compteurs(), classifieur.min_exemples
+        )
+        return modele if modele.pret else None
+
+    @api.model
+    def classer(self, values_list):
+        """
+        Évalue un lot de courriels entrants : déplace vers Spam ou fixe la
+        priorité lorsque la confiance dépasse le seuil du classifieur.
+        """
+        modele_spam = self._get_modele("spam")
+        modele_priorite = self._get_modele("priorite")
+        if not (modele_spam or modele_priorite):
+            return values_list
+
+        seuils = {c.code: c.seuil for c in self.sudo().search([])}
+        dossiers = self.env["mail.dossier"].search([("code", "in", ["inbox", "spam"])])
+        dossier_inbox = dossiers.filtered(lambda d: d.code == "inbox")[:1]
+        dossier_spam = dossiers.filtered(lambda d: d.code == "spam")[:1]
+
+        for values in values_list:
+            indices = _caracteristiques(values.get("name"), values.get("expediteur_email"), values.get("contenu"))
+            if modele_spam:
+                score = modele_spam.probabilites(indices)["spam"]
+                values["spam_score"] = score
+                # Les règles de classement explicites restent prioritaires
+                if (score >= seuils["spam"] and dossier_spam
+                        and values.get("dossier_id") == dossier_inbox.id):
+                    values["dossier_id"] = dossier_spam.id
+            if modele_priorite and "priorite" not in values:
+                probabilites = modele_priorite.probabilites(indices)
+                classe = max(probabilites, key=probabilites.get)
+                if probabilites[classe] >= seuils["priorite"]:
+                    values["priorite"] = classe
+        return values_list
+
+    @api.model
+    def _cron_entrainer(self, taille_lot=1000):
+        """
+        Entraînement incrémental : chaque courriel dont l'étiquette
+        d'apprentissage a changé retire sa contribution à l'ancienne classe
+        et l'ajoute à la nouvelle. Les comptes sont agrégés par lot avant
+        d'être reportés dans les tableaux. Les classifieurs ne sont
+        réenregistrés que si au moins un exemple a été appris.
+        """
+        Courriel = self.env["mail.courriel"]
+        classifieurs = {c.code: c for c in self.search([])}
+        if not classifieurs or not Courriel.search_count([("classif_a_apprendre", "=", True)], limit=1):
+            return True
+        compteurs = {code: c._lire_compteurs() for code, c in classifieurs.items()}
+        documents = {code: dict(c.documents or {}) for code, c in classifieurs.items()}
+
+        champs = ["name", "expediteur_email", "contenu",
+                  "classif_spam_cible", "classif_spam_appris",
+                  "classif_priorite_cible", "classif_priorite_appris"]
+        modifies = set()
+        dernier_id = 0
+        while True:
+            lot = Courriel.search_read(
+                [("classif_a_apprendre", "=", True), ("id", ">", dernier_id)],
+                champs, order="id", limit=taille_lot
+            )
+            if not lot:
+                break
+            dernier_id = lot[-1]["id"]
+            deltas = {code: Counter() for code in classifieurs}
+            appris = {}
+            for courriel in lot:
+                indices = None
+                for code in classifieurs:
+                    cible = courriel[f"classif_{code}_cible"]
+                    ancien = courriel[f"classif_{code}_appris"]
+                    if cible == ancien:
+                        continue
+                    if indices is None:
+                        indices = Counter(_caracteristiques(
+                            courriel["name"], courriel["expediteur_email"], courriel["contenu"]
+                        ))
+                    modifies.add(code)
+                    classes = CLASSES[code]
+                    for classe, signe in ((ancien, -1), (cible, 1)):
+                        if not classe:
+                            continue
+                        decalage = classes.index(classe) * NB_CASES
+                        for indice, n in indices.items():
+                            deltas[code][decalage + indice] += signe * n
+                        documents[code][classe] = documents[code].get(classe, 0) + signe
+                cle = (courriel["classif_spam_cible"], courriel["classif_priorite_cible"])
+                appris.setdefault(cle, []).append(courriel["id"])
+            for code, delta in deltas.items():
+                tableau = compteurs[code]
+                for position, n in delta.items():
+                    tableau[position] = max(tableau[position] + n, 0)
+            for (spam, priorite), ids in appris.items():
+                Courriel.browse(ids).write({
+                    "classif_spam_appris": spam,
+                    "classif_priorite_appris": priorite,
+                    "classif_a_apprendre": False,
+                })
+            self.env.invalidate_all()
+
+        for code in modifies:
+            classifieurs[code].write({
+                "compteurs": base64.b64encode(zlib.compress(compteurs[code].tobytes())),
+                "documents": documents[code],
+                "date_entrainement": fields.Datetime.now(),
+            })
+        return True
+
+    def write(self, vals):
+        result = super().write(vals)
+        if CHAMPS_MODELE.intersection(vals):
+            self.env.registry.clear_cache()
+        return result
+
+
+class MailCourrielClassifieur(models.Model):
+    _inherit = "mail.courriel"
+
+    spam_score = fields.Float(
+        string="Score spam",
+        readonly=True,
+        copy=False,
+        help="Probabilité de spam estimée par le classifieur local à la réception"
+    )
+
+    classif_spam_cible = fields.Selection([
+        ("ham", "Légitime"),
+        ("spam", "Spam"),
+    ], string="Apprentissage spam", readonly=True, copy=False)
+
+    classif_spam_appris = fields.Selection([
+        ("ham", "Légitime"),
+        ("spam", "Spam"),
+    ], string="Spam appris", readonly=True, copy=False)
+
+    classif_priorite_cible = fields.Selection([
+        ("0", "Basse"),
+        ("1", "Normale"),
+        ("2", "Haute"),
+        ("3", "Urgente"),
+    ], string="Apprentissage priorité", readonly=True, copy=False)
+
+    classif_priorite_appris = fields.Selection([
+        ("0", "Basse"),
+        ("1", "Normale"),
+        ("2", "Haute"),
+        ("3", "Urgente"),
+    ], string="Priorité apprise", readonly=True, copy=False)
+
+    classif_a_apprendre = fields.Boolean(
+        string="À apprendre",
+        readonly=True,
+        copy=False,
+        index=True
+    )
+
+    @api.model
+    def _classer_entrants(self, values_list):
+        values_list = super()._classer_entrants(values_list)
+        return self.env["mail.classifieur"].classer(values_list)
+
+    def write(self, vals):
+        """
+        Enregistre les décisions de l'utilisateur (déplacement vers ou hors
+        du dossier Spam, choix de la priorité) comme exemples d'apprentissage.
+        """
+        anciens_spam = {}
+        if "dossier_id" in vals:
+            dossier_spam = self.env["mail.dossier"].search([("code", "=", "spam")], limit=1)
+            anciens_spam = {c.id: c.dossier_id == dossier_spam for c in self}
+        result = super().write(vals)
+
+        if "priorite" in vals:
+            super(MailCourrielClassifieur, self.filtered("is_entrant")).write({
+                "classif_priorite_cible": vals["priorite"],
+                "classif_a_apprendre": True,
+            })
+        if anciens_spam:
+            nouveau_spam = self.env["mail.dossier"].browse(vals["dossier_id"]).code == "spam"
+            # Un courriel classé ailleurs que dans Spam est un exemple légitime
+            changes = self.filtered(lambda c: c.is_entrant and (
+                anciens_spam[c.id] != nouveau_spam
+                or (not nouveau_spam and not c.classif_spam_cible)
+            ))
+            if changes:
+                super(MailCourrielClassifieur, changes).write({
+                    "classif_spam_cible": "spam" if nouveau_spam else "ham",
+                    "classif_a_apprendre": True,
+                })
+        return result
@@ -1,8 +1,39 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError
+from odoo.tools import html_sanitize
+import base64
+import binascii
 import email
+import hashlib
+import html
 import re
 
+# Images inline (data:...;base64) au-delà de cette taille extraites en pièces jointes
+TAILLE_MAX_IMAGE_INLINE = 16 * 1024
+
+# Nombre de courriels complétés par requête lors de la mise à jour du module
+TAILLE_LOT_INIT = 1000
+
+IMAGE_INLINE_RE = re.compile(
+    r'''(src\s*=\s*)(["'])data:(image/[\w.+-]+);base64,([A-Za-z0-9+/=\s]+)\2''',
+    re.IGNORECASE
+)
+
+# Marqueur de contexte : contenu déjà normalisé par _creer_entrants.
+# Objet Python, il ne peut pas être transmis par un appel RPC.
+CONTENU_PREPARE = object()
+
+
+def _empreinte(contenu):
+    """Empreinte du contenu nettoyé, pour détecter un contenu inchangé"""
+    return hashlib.sha1(str(contenu).encode()).hexdigest() if contenu else False
+
+
+def _texte_apercu(contenu, longueur=200):
+    """Début du contenu HTML en texte brut"""
+    texte = re.sub(r'<[^>]+>', ' ', contenu or '')
+    return re.sub(r'\s+', ' ', html.unescape(texte)).strip()[:longueur]
+
 
 class MailCourriel(models.Model):
     _name = "mail.courriel"
@@ -48,9 +79,22 @@ class MailCourriel(models.Model):
         string="CC"
     )
     
+    # Nettoyé une seule fois par _preparer_contenu lors de create/write
     contenu = fields.Html(
         string="Contenu",
-        sanitize=True
+        sanitize=False
+    )
+    
+    contenu_hash = fields.Char(
+        string="Empreinte du contenu",
+        readonly=True,
+        copy=False
+    )
+    
+    apercu = fields.Char(
+        string="Aperçu",
+        readonly=True,
+        help="Début du contenu en texte brut, affiché dans la liste des courriels"
     )
     
     date_envoi = fields.Datetime(
@@ -125,6 +169,7 @@ class MailCourriel(models.Model):
     message_id = fields.Char(
         string="Message-ID",
         readonly=True,
+        index=True,
         help="Identifiant unique du message email"
     )
     
@@ -133,6 +178,35 @@ class MailCourriel(models.Model):
         readonly=True
     )
 
+    def init(self):
+        """
+        Complète l'aperçu et l'empreinte des courriels enregistrés avant
+        l'introduction de _preparer_contenu, sans modifier write_date.
+        """
+        super().init()
+        dernier_id = 0
+        while True:
+            self._cr.execute(f"""
+                SELECT id, contenu FROM {self._table}
+                 WHERE id > %s AND contenu_hash IS NULL
+                   AND contenu IS NOT NULL AND contenu != ''
+                 ORDER BY id LIMIT %s
+            """, (dernier_id, TAILLE_LOT_INIT))
+            lignes = self._cr.fetchall()
+            if not lignes:
+                break
+            dernier_id = lignes[-1][0]
+            self._cr.execute(f"""
+                UPDATE {self._table} AS c
+                   SET contenu_hash = v.empreinte, apercu = v.apercu
+                  FROM unnest(%s::int[], %s::varchar[], %s::varchar[]) AS v(id, empreinte, apercu)
+                 WHERE c.id = v.id
+            """, (
+                [ligne[0] for ligne in lignes],
+                [_empreinte(ligne[1]) for ligne in lignes],
+                [_texte_apercu(ligne[1]) for ligne in lignes],
+            ))
+
     @api.model
     def _get_default_dossier(self):
         """Retourne le dossier Brouillons par défaut"""
@@ -143,15 +217,111 @@ class MailCourriel(models.Model):
         for record in self:
             record.attachment_count = len(record.attachment_ids)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        if self.env.context.get("mail_courriel_contenu") is CONTENU_PREPARE:
+            return super().create(vals_list)
+        pieces_jointes = []
+        for vals in vals_list:
+            pieces = self.env["ir.attachment"]
+            if "contenu" in vals:
+                pieces = self._preparer_contenu(vals)
+            pieces_jointes.append(pieces)
+        records = super().create(vals_list)
+        # Rattacher les images extraites aux courriels créés
+        for record, pieces in zip(records, pieces_jointes):
+            if pieces:
+                pieces.write({"res_id": record.id})
+        return records
+
+    def write(self, vals):
+        if "contenu" in vals:
+            vals = dict(vals)
+            # Contenu renvoyé tel quel (déjà nettoyé) : rien à refaire
+            if all(record.contenu_hash == _empreinte(vals["contenu"]) for record in self):
+                del vals["contenu"]
+            else:
+                self._preparer_contenu(vals, self.id if len(self) == 1 else 0)
+        return super().write(vals)
+
+    @api.model
+    def _preparer_contenu(self, vals, res_id=0):
+        """
+        Normalise le contenu en une seule passe : extraction des images
+        inline volumineuses en pièces jointes, nettoyage HTML, empreinte et
+        aperçu. Modifie vals et retourne les pièces jointes créées.
+        """
+        contenu, pieces = self._extraire_images_inline(vals.get("contenu") or "", res_id)
+        if contenu:
+            contenu = html_sanitize(
+                contenu,
+                silent=True,
+                sanitize_tags=True,
+                sanitize_attributes=True,
+                sanitize_style=False,
+                sanitize_form=True,
+                strip_style=False,
+                strip_classes=False,
+            )
+        vals.update({
+            "contenu": contenu or False,
+            "contenu_hash": _empreinte(contenu),
+            "apercu": _texte_apercu(contenu),
+        })
+        if pieces:
+            vals["attachment_ids"] = list(vals.get("attachment_ids") or []) + [(4, p.id) for p in pieces]
+        return pieces
+
+    @api.model
+    def _extraire_images_inline(self, contenu, res_id=0):
+        """
+        Remplace les images base64 volumineuses par des pièces jointes,
+        avant le nettoyage pour ne pas faire analyser ces données.
+        """
+        pieces = self.env["ir.attachment"]
+        if "data:" not in contenu:
+            return contenu, pieces
+
+        def remplacer(match):
+            nonlocal pieces
+            prefixe, guillemet, mimetype, donnees = match.groups()
+            if len(donnees) < TAILLE_MAX_IMAGE_INLINE:
+                return match.group(0)
+            try:
+                raw = base64.b64decode(donnees)
+            except (ValueError, binascii.Error):
+                return match.group(0)
+            piece = self.env["ir.attachment"].create({
+                "name": f"image_{len(pieces) + 1}.{mimetype.split('/')[1]}",
+                "raw": raw,
+                "mimetype": mimetype,
+                "res_model": self._name,
+                "res_id": res_id,
+            })
+            pieces |= piece
+            return f"{prefixe}{guillemet}/web/image/{piece.id}{guillemet}"
+
+        return IMAGE_INLINE_RE.sub(remplacer, contenu), pieces
+
     @api.model
     def message_new(self, msg_dict, custom_values=None):
         """
         Crée un nouveau courriel à partir d'un email entrant (fetchmail/IMAP).
         Cette méthode est appelée automatiquement par Odoo lors de la réception d'emails.
         """
-        if custom_values is None:
-            custom_values = {}
+        values = self._preparer_valeurs_entrantes(msg_dict)
         
+        # Créer directement l'enregistrement sans passer par super()
+        # pour éviter les comportements par défaut de mail.thread
+        return self._creer_entrants([values], custom_values)
+
+    @api.model
+    def _preparer_valeurs_entrantes(self, msg_dict, dossier=None):
+        """
+        Prépare les valeurs d'un courriel entrant à partir d'un message
+        analysé (message_parse). Par défaut, le courriel va dans la boîte
+        de réception.
+        """
         # Extraire les informations du message
         subject = msg_dict.get('subject', 'Sans objet')
         email_from = msg_dict.get('email_from', '')
@@ -164,10 +334,11 @@ class MailCourriel(models.Model):
         partner_from = self._find_or_create_partner(email_from)
         
         # Trouver le dossier Inbox (Boîte de réception)
-        dossier_inbox = self.env["mail.dossier"].search([("code", "=", "inbox")], limit=1)
+        if dossier is None:
+            dossier = self.env["mail.dossier"].search([("code", "=", "inbox")], limit=1)
         
         # Préparer les valeurs du courriel entrant
-        values = {
+        return {
             'name': subject or 'Sans objet',
             'expediteur_id': partner_from.id if partner_from else False,
             'expediteur_email': email_from,
@@ -177,15 +348,41 @@ class MailCourriel(models.Model):
             'date_envoi': date,
             'is_entrant': True,
             'statut': 'envoye',  # Statut "non lu" pour email reçu
-            'dossier_id': dossier_inbox.id if dossier_inbox else False,
+            'dossier_id': dossier.id if dossier else False,
             'message_id': message_id,
         }
-        values.update(custom_values)
-        
-        # Créer directement l'enregistrement sans passer par super()
-        # pour éviter les comportements par défaut de mail.thread
-        record = self.create(values)
-        return record
+
+    @api.model
+    def _creer_entrants(self, values_list, custom_values=None):
+        """
+        Crée un lot de courriels entrants. Le contenu est normalisé une
+        seule fois, avant le classement : règles et classifieur analysent
+        le texte nettoyé qui sera enregistré. Les valeurs imposées
+        (custom_values) restent prioritaires sur le classement.
+        """
+        custom_values = dict(custom_values or {})
+        if "contenu" in custom_values:
+            contenu = custom_values.pop("contenu")
+            for values in values_list:
+                values["contenu"] = contenu
+        pieces_jointes = [self._preparer_contenu(values) for values in values_list]
+        values_list = self._classer_entrants(values_list)
+        for values in values_list:
+            values.update(custom_values)
+        records = self.with_context(mail_courriel_contenu=CONTENU_PREPARE).create(values_list)
+        # Rattacher les images extraites aux courriels créés
+        for record, pieces in zip(records, pieces_jointes):
+            if pieces:
+                pieces.write({"res_id": record.id})
+        return records.with_context(mail_courriel_contenu=None)
+
+    @api.model
+    def _classer_entrants(self, values_list):
+        """
+        Classe un lot de courriels entrants (dossier, étiquettes, priorité)
+        avant leur création.
+        """
+        return self.env["mail.regle"].appliquer_regles(values_list)
 
     @api.model
     def _find_or_create_partner(self, email_address):
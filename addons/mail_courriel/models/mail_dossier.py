@@ -90,3 +90,9 @@ class MailDossier(models.Model):
                 raise models.ValidationError(
                     f"Le dossier système '{dossier.name}' ne peut pas être supprimé."
                 )
+
+    def unlink(self):
+        result = super().unlink()
+        # Les règles de classement compilées peuvent référencer ce dossier
+        self.env.registry.clear_cache()
+        return result
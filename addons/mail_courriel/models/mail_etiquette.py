@@ -59,3 +59,9 @@ class MailEtiquette(models.Model):
             "view_mode": "tree,form",
             "domain": [("etiquette_ids", "in", [self.id])],
         }
+
+    def unlink(self):
+        result = super().unlink()
+        # Les règles de classement compilées peuvent référencer cette étiquette
+        self.env.registry.clear_cache()
+        return result
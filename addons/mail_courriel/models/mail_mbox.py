@@ -0,0 +1,260 @@
+import email
+import email.policy
+import email.utils
+import logging
+import os
+import re
+import time
+from datetime import timezone
+from email.message import EmailMessage
+from odoo import models, fields, api
+from odoo.exceptions import AccessError, UserError
+
+_logger = logging.getLogger(__name__)
+
+# Nombre de courriels lus ou créés par lot
+TAILLE_LOT = 200
+
+# Paramètre système : seul répertoire autorisé pour l'import et l'export
+PARAM_REPERTOIRE = "mail_courriel.repertoire_mbox"
+
+# Quotage mboxrd des lignes "From " dans le corps des messages
+FROM_QUOTE_RE = re.compile(rb'^(>*From )', re.MULTILINE)
+FROM_UNQUOTE_RE = re.compile(rb'^>(>*From )')
+
+
+def _lire_mbox(chemin):
+    """
+    Générateur des messages bruts d'un fichier mbox, lu ligne à ligne.
+    Le contenu précédant la première ligne "From " est ignoré.
+    """
+    with open(chemin, 'rb') as fichier:
+        lignes = None
+        for ligne in fichier:
+            if ligne.startswith(b'From '):
+                if lignes:
+                    yield b''.join(lignes)
+                lignes = []
+                continue
+            if lignes is not None:
+                lignes.append(FROM_UNQUOTE_RE.sub(rb'\1', ligne))
+        if lignes:
+            yield b''.join(lignes)
+
+
+def _lire_eml(repertoire):
+    """Générateur des messages bruts des fichiers .eml d'un répertoire"""
+    for entree in sorted(os.scandir(repertoire), key=lambda e: e.name):
+        if entree.is_file(follow_symlinks=False) and entree.name.lower().endswith('.eml'):
+            with open(entree.path, 'rb') as fichier:
+                yield fichier.read()
+
+
+def _par_lots(elements, taille):
+    lot = []
+    for element in elements:
+        lot.append(element)
+        if len(lot) >= taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+def _entete(valeur):
+    """Valeur d'en-tête sur une seule ligne"""
+    return ' '.join((valeur or '').split())
+
+
+class MailCourrielExport(models.TransientModel):
+    _name = "mail.courriel.export"
+    _description = "Export mbox de courriels"
+
+    domaine = fields.Json(
+        string="Domaine",
+        required=True
+    )
+
+
+class MailCourrielMbox(models.Model):
+    _inherit = "mail.courriel"
+
+    # ============================================
+    # IMPORT
+    # ============================================
+
+    @api.model
+    def _chemin_mbox(self, chemin):
+        """
+        Réservé aux administrateurs : retourne le chemin absolu, à
+        condition qu'il se trouve dans le répertoire configuré.
+        """
+        if not self.env.is_system():
+            raise AccessError("Seul un administrateur peut importer ou exporter des courriels.")
+        racine = self.env["ir.config_parameter"].sudo().get_param(PARAM_REPERTOIRE)
+        if not racine:
+            raise UserError(f"Aucun répertoire d'import/export configuré (paramètre système {PARAM_REPERTOIRE}).")
+        racine = os.path.realpath(racine)
+        complet = os.path.realpath(os.path.join(racine, chemin))
+        if os.path.commonpath([racine, complet]) != racine:
+            raise AccessError(f"Le chemin doit se trouver dans le répertoire {racine}.")
+        return complet
+
+    @api.model
+    def _importer_mbox(self, chemin, dossier_code="inbox", valider=False):
+        """Importe un fichier mbox du répertoire configuré sans le charger en mémoire"""
+        chemin = self._chemin_mbox(chemin)
+        if not os.path.isfile(chemin):
+            raise UserError(f"Fichier mbox introuvable : {chemin}")
+        return self._importer_messages(_lire_mbox(chemin), dossier_code, valider)
+
+    @api.model
+    def _importer_eml(self, repertoire, dossier_code="inbox", valider=False):
+        """Importe les fichiers .eml d'un répertoire situé dans le répertoire configuré"""
+        repertoire = self._chemin_mbox(repertoire)
+        if not os.path.isdir(repertoire):
+            raise UserError(f"Répertoire introuvable : {repertoire}")
+        return self._importer_messages(_lire_eml(repertoire), dossier_code, valider)
+
+    @api.model
+    def _importer_messages(self, messages, dossier_code, valider=False):
+        """
+        Crée les courriels par lots à partir d'un flux de messages bruts.
+        Les messages déjà présents (même Message-ID) sont ignorés. Le cache
+        est vidé après chaque lot pour garder une mémoire constante.
+        Avec valider=True, chaque lot est validé (commit) : à n'utiliser que
+        depuis un curseur dédié (odoo shell, script), jamais dans une
+        requête RPC. Sinon tout l'import tient dans la transaction appelante.
+        Retourne le nombre de courriels créés.
+        """
+        dossier = self.env["mail.dossier"].search([("code", "=", dossier_code)], limit=1)
+        if not dossier:
+            raise UserError(f"Dossier introuvable : {dossier_code}")
+        Thread = self.env["mail.thread"]
+        total = 0
+        for lot in _par_lots(messages, TAILLE_LOT):
+            msg_dicts = [
+                Thread.message_parse(email.message_from_bytes(brut, policy=email.policy.SMTP))
+                for brut in lot
+            ]
+            message_ids = [d["message_id"] for d in msg_dicts if d.get("message_id")]
+            deja_vus = set(self.search([("message_id", "in", message_ids)]).mapped("message_id"))
+
+            values_list = []
+            pieces_jointes = []
+            for msg_dict in msg_dicts:
+                message_id = msg_dict.get("message_id")
+                if message_id:
+                    if message_id in deja_vus:
+                        continue
+                    deja_vus.add(message_id)
+                values = self._preparer_valeurs_entrantes(msg_dict, dossier=dossier)
+                pieces = self.env["ir.attachment"]
+                if msg_dict.get("attachments"):
+                    pieces = self.env["ir.attachment"].create([{
+                        "name": piece.fname,
+                        "raw": piece.content.encode() if isinstance(piece.content, str) else piece.content,
+                        "res_model": self._name,
+                        "res_id": 0,
+                    } for piece in msg_dict["attachments"]])
+                    values["attachment_ids"] = [(4, p.id) for p in pieces]
+                values_list.append(values)
+                pieces_jointes.append(pieces)
+
+            if values_list:
+                records = self._creer_entrants(values_list)
+                # Rattacher les pièces jointes aux courriels créés
+                for record, pieces in zip(records, pieces_jointes):
+                    if pieces:
+                        pieces.write({"res_id": record.id})
+                total += len(values_list)
+            self.env.flush_all()
+            if valider:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        return total
+
+    # ============================================
+    # EXPORT
+    # ============================================
+
+    @api.model
+    def _exporter_mbox(self, domaine, chemin):
+        """Exporte les courriels du domaine dans un fichier mbox du répertoire configuré, par morceaux"""
+        chemin = self._chemin_mbox(chemin)
+        total = 0
+        with open(chemin, 'wb') as fichier:
+            for morceau in self._generer_mbox(domaine):
+                fichier.write(morceau)
+                total += 1
+        return total
+
+    def action_exporter_mbox(self):
+        """
+        Télécharger les courriels sélectionnés au format mbox. La sélection
+        est conservée côté serveur : l'URL ne porte que l'identifiant de
+        l'export, quelle que soit la taille de la sélection.
+        """
+        domaine = self.env.context.get("active_domain")
+        # Toute la recherche est sélectionnée : exporter le domaine plutôt que les ids
+        if not domaine or self.search_count(domaine) != len(self):
+            domaine = [("id", "in", self.ids)]
+        export = self.env["mail.courriel.export"].create({"domaine": domaine})
+        return {
+            "type": "ir.actions.act_url",
+            "url": f"/mail_courriel/export_mbox?export_id={export.id}",
+            "target": "self",
+        }
+
+    @api.model
+    def _generer_mbox(self, domaine):
+        """
+        Générateur des courriels du domaine au format mbox (mboxrd), un
+        message à la fois. Les courriels sont lus par lots d'identifiants
+        croissants et le cache est vidé après chaque lot. Un courriel
+        impossible à convertir est ignoré sans interrompre l'export.
+        """
+        dernier_id = 0
+        while True:
+            lot = self.search(list(domaine) + [("id", ">", dernier_id)], order="id", limit=TAILLE_LOT)
+            if not lot:
+                break
+            for courriel in lot:
+                try:
+                    morceau = courriel._vers_mbox()
+                except Exception as e:
+                    _logger.warning(f"Export mbox : courriel {courriel.id} ignoré ({e})")
+                    continue
+                yield morceau
+            dernier_id = lot.ids[-1]
+            self.env.invalidate_all()
+
+    def _vers_mbox(self):
+        """Représentation mbox d'un courriel"""
+        self.ensure_one()
+        message = EmailMessage()
+        message["Subject"] = _entete(self.name)
+        message["From"] = _entete(self.expediteur_email or self.expediteur_id.email_formatted)
+        destinataires = self.destinataire_email or ", ".join(self.destinataire_ids.mapped("email_formatted"))
+        if destinataires:
+            message["To"] = _entete(destinataires)
+        if self.cc_ids:
+            message["Cc"] = _entete(", ".join(self.cc_ids.mapped("email_formatted")))
+        date = self.date_reception or self.date_envoi
+        if date:
+            message["Date"] = email.utils.format_datetime(date.replace(tzinfo=timezone.utc))
+        # Un Message-ID doit être en ASCII (RFC 5322), sinon il est omis
+        message_id = _entete(self.message_id)
+        if message_id and message_id.isascii():
+            message["Message-ID"] = message_id
+        message.set_content(str(self.contenu or ""), subtype="html")
+        for piece in self.attachment_ids:
+            maintype, _sep, subtype = (piece.mimetype or "application/octet-stream").partition("/")
+            message.add_attachment(piece.raw or b"", maintype=maintype, subtype=subtype, filename=piece.name)
+
+        expediteur = email.utils.parseaddr(message["From"] or "")[1] or "MAILER-DAEMON"
+        horodatage = time.asctime(date.timetuple()) if date else time.asctime()
+        corps = FROM_QUOTE_RE.sub(rb'>\1', message.as_bytes(policy=email.policy.default))
+        if not corps.endswith(b"\n"):
+            corps += b"\n"
+        return f"From {expediteur} {horodatage}\n".encode() + corps + b"\n"
@@ -0,0 +1,271 @@
+import re
+from odoo import models, fields, api, tools
+from odoo.exceptions import ValidationError
+
+EMAIL_RE = re.compile(r'[\w\.\+-]+@[\w\.-]+')
+MOT_RE = re.compile(r'\w+')
+BALISE_RE = re.compile(r'<[^>]+>')
+
+
+def _split_valeurs(valeurs):
+    """Découpe une liste de valeurs séparées par des virgules"""
+    return [v.strip().lower() for v in (valeurs or '').split(',') if v.strip()]
+
+
+class _IndexAdresses:
+    """
+    Index haché des adresses et domaines : une recherche coûte un accès
+    dictionnaire par adresse et par niveau de domaine, quel que soit le
+    nombre de règles.
+    """
+
+    def __init__(self):
+        self.adresses = {}
+        self.domaines = {}
+
+    def ajouter(self, valeur, bit):
+        if '@' in valeur and not valeur.startswith('@'):
+            self.adresses[valeur] = self.adresses.get(valeur, 0) | bit
+        else:
+            domaine = valeur.lstrip('@')
+            self.domaines[domaine] = self.domaines.get(domaine, 0) | bit
+
+    def rechercher(self, texte):
+        masque = 0
+        for adresse in EMAIL_RE.findall(texte.lower()):
+            masque |= self.adresses.get(adresse, 0)
+            # "mail.acme.com" correspond aussi aux règles sur "acme.com"
+            domaine = adresse.rpartition('@')[2]
+            while domaine:
+                masque |= self.domaines.get(domaine, 0)
+                domaine = domaine.partition('.')[2]
+        return masque
+
+
+class _IndexMotsCles:
+    """
+    Index des mots-clés par premier mot : le texte est découpé en mots en
+    une seule passe, puis chaque mot distinct est cherché dans l'index.
+    Les expressions de plusieurs mots sont vérifiées sur le texte normalisé.
+    """
+
+    def __init__(self):
+        self.mots = {}
+
+    def ajouter(self, valeur, bit):
+        tokens = MOT_RE.findall(valeur)
+        if not tokens:
+            return
+        expression = ' '.join(tokens)
+        candidats = self.mots.setdefault(tokens[0], {})
+        candidats[expression] = candidats.get(expression, 0) | bit
+
+    def rechercher(self, texte):
+        tokens = MOT_RE.findall(texte.lower())
+        if not tokens:
+            return 0
+        masque = 0
+        texte_normalise = None
+        for token in set(tokens).intersection(self.mots):
+            for expression, bits in self.mots[token].items():
+                if expression == token:
+                    masque |= bits
+                    continue
+                if texte_normalise is None:
+                    texte_normalise = ' %s ' % ' '.join(tokens)
+                if ' %s ' % expression in texte_normalise:
+                    masque |= bits
+        return masque
+
+
+class MoteurRegles:
+    """
+    Règles de classement compilées. Chaque règle occupe un bit : une
+    condition produit le masque des règles satisfaites, et les masques de
+    toutes les conditions sont combinés par ET binaire.
+    """
+
+    CONDITIONS = {
+        'expediteur': ('expediteur_email', _IndexAdresses),
+        'destinataire': ('destinataire_email', _IndexAdresses),
+        'objet': ('name', _IndexMotsCles),
+        'contenu': ('contenu', _IndexMotsCles),
+    }
+
+    def __init__(self, regles):
+        self.actions = []
+        self.tous = 0
+        self.index = {cond: classe() for cond, (_champ, classe) in self.CONDITIONS.items()}
+        self.contraintes = dict.fromkeys(self.CONDITIONS, 0)
+        for position, regle in enumerate(regles):
+            bit = 1 << position
+            self.tous |= bit
+            for cond in self.CONDITIONS:
+                valeurs = _split_valeurs(regle[cond])
+                if valeurs:
+                    self.contraintes[cond] |= bit
+                for valeur in valeurs:
+                    self.index[cond].ajouter(valeur, bit)
+            self.actions.append(regle['actions'])
+
+    def _texte(self, cond, values):
+        texte = values.get(self.CONDITIONS[cond][0]) or ''
+        if cond == 'contenu':
+            texte = BALISE_RE.sub(' ', texte)
+        return texte
+
+    def correspondances(self, values):
+        """Retourne les positions des règles satisfaites, dans l'ordre"""
+        masque = self.tous
+        for cond, contrainte in self.contraintes.items():
+            if not masque:
+                break
+            if contrainte & masque:
+                trouve = self.index[cond].rechercher(self._texte(cond, values))
+                masque &= ~contrainte | trouve
+        positions = []
+        while masque:
+            bas = masque & -masque
+            positions.append(bas.bit_length() - 1)
+            masque ^= bas
+        return positions
+
+    def appliquer(self, values):
+        """Applique les actions des règles satisfaites aux valeurs du courriel"""
+        dossier_fixe = priorite_fixee = False
+        etiquette_ids = []
+        for position in self.correspondances(values):
+            dossier_id, regle_etiquette_ids, priorite, arreter = self.actions[position]
+            if dossier_id and not dossier_fixe:
+                values['dossier_id'] = dossier_id
+                dossier_fixe = True
+            if priorite and not priorite_fixee:
+                values['priorite'] = priorite
+                priorite_fixee = True
+            etiquette_ids.extend(e for e in regle_etiquette_ids if e not in etiquette_ids)
+            if arreter:
+                break
+        if etiquette_ids:
+            values.setdefault('etiquette_ids', []).extend((4, e) for e in etiquette_ids)
+        return values
+
+
+class MailRegle(models.Model):
+    _name = "mail.regle"
+    _description = "Règle de classement des courriels"
+    _order = "sequence, id"
+
+    name = fields.Char(
+        string="Nom",
+        required=True
+    )
+
+    sequence = fields.Integer(
+        string="Séquence",
+        default=10
+    )
+
+    active = fields.Boolean(
+        string="Actif",
+        default=True
+    )
+
+    # Conditions (toutes les conditions renseignées doivent être satisfaites)
+    expediteur = fields.Char(
+        string="Expéditeur",
+        help="Adresses ou domaines séparés par des virgules (ex: factures@acme.com, @fournisseur.fr)"
+    )
+
+    destinataire = fields.Char(
+        string="Destinataire",
+        help="Adresses ou domaines séparés par des virgules"
+    )
+
+    objet = fields.Char(
+        string="Mots-clés de l'objet",
+        help="Mots ou expressions séparés par des virgules, au moins un doit figurer dans l'objet"
+    )
+
+    contenu = fields.Char(
+        string="Mots-clés du contenu",
+        help="Mots ou expressions séparés par des virgules, au moins un doit figurer dans le contenu"
+    )
+
+    # Actions
+    dossier_id = fields.Many2one(
+        "mail.dossier",
+        string="Déplacer vers",
+        ondelete="cascade"
+    )
+
+    etiquette_ids = fields.Many2many(
+        "mail.etiquette",
+        "mail_regle_etiquette_rel",
+        "regle_id",
+        "etiquette_id",
+        string="Ajouter les étiquettes"
+    )
+
+    priorite = fields.Selection([
+        ("0", "Basse"),
+        ("1", "Normale"),
+        ("2", "Haute"),
+        ("3", "Urgente"),
+    ], string="Définir la priorité")
+
+    arreter = fields.Boolean(
+        string="Arrêter le traitement",
+        default=False,
+        help="Ne pas appliquer les règles suivantes si celle-ci est satisfaite"
+    )
+
+    @api.constrains("expediteur", "destinataire", "objet", "contenu", "dossier_id", "etiquette_ids", "priorite")
+    def _check_regle(self):
+        for regle in self:
+            if not any(_split_valeurs(regle[cond]) for cond in MoteurRegles.CONDITIONS):
+                raise ValidationError(f"La règle '{regle.name}' doit avoir au moins une condition.")
+            if not (regle.dossier_id or regle.etiquette_ids or regle.priorite):
+                raise ValidationError(f"La règle '{regle.name}' doit avoir au moins une action.")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        regles = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return regles
+
+    def write(self, vals):
+        result = super().write(vals)
+        self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+
+    @api.model
+    @tools.ormcache()
+    def _get_moteur(self):
+        """Compile les règles actives, une fois par base de données"""
+        regles = self.sudo().search([])
+        return MoteurRegles([{
+            'expediteur': regle.expediteur,
+            'destinataire': regle.destinataire,
+            'objet': regle.objet,
+            'contenu': regle.contenu,
+            'actions': (
+                regle.dossier_id.id,
+                tuple(regle.etiquette_ids.ids),
+                regle.priorite,
+                regle.arreter,
+            ),
+        } for regle in regles])
+
+    @api.model
+    def appliquer_regles(self, values_list):
+        """Applique les règles à un lot de valeurs de courriels entrants"""
+        moteur = self._get_moteur()
+        if moteur.tous:
+            for values in values_list:
+                moteur.appliquer(values)
+        return values_list
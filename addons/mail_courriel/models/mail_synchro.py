@@ -0,0 +1,165 @@
+from datetime import timedelta
+from odoo import models, fields, api
+from odoo.tools.sql import create_index
+
+# Durée de conservation du journal des retraits (jours)
+RETENTION_RETRAITS = 30
+
+
+class MailCourrielRetrait(models.Model):
+    _name = "mail.courriel.retrait"
+    _description = "Journal des courriels retirés d'un dossier"
+    _order = "id"
+
+    courriel_id = fields.Integer(
+        string="Courriel",
+        required=True
+    )
+
+    dossier_id = fields.Many2one(
+        "mail.dossier",
+        string="Dossier",
+        required=True,
+        ondelete="cascade",
+        index=True
+    )
+
+    def init(self):
+        create_index(self._cr, "mail_courriel_retrait_dossier_create_date_index",
+                     self._table, ["dossier_id", "create_date"])
+
+    @api.model
+    def _cron_purger(self):
+        """Supprime les retraits plus anciens que la durée de conservation"""
+        limite = fields.Datetime.now() - timedelta(days=RETENTION_RETRAITS)
+        self.search([("create_date", "<", limite)]).unlink()
+        return True
+
+
+class MailCourrielSynchro(models.Model):
+    _inherit = "mail.courriel"
+
+    SYNCHRO_CHAMPS = [
+        "id", "name", "expediteur_id", "expediteur_email", "date_envoi", "write_date",
+        "statut", "priorite", "apercu", "contenu_hash", "is_entrant", "attachment_count",
+    ]
+
+    def init(self):
+        super().init()
+        create_index(self._cr, "mail_courriel_dossier_write_date_index",
+                     self._table, ["dossier_id", "write_date"])
+        create_index(self._cr, "mail_courriel_write_date_index",
+                     self._table, ["write_date"])
+
+    def write(self, vals):
+        if "dossier_id" in vals:
+            retraits = [
+                {"courriel_id": courriel.id, "dossier_id": courriel.dossier_id.id}
+                for courriel in self
+                if courriel.dossier_id and courriel.dossier_id.id != vals["dossier_id"]
+            ]
+            if retraits:
+                self.env["mail.courriel.retrait"].sudo().create(retraits)
+        return super().write(vals)
+
+    def unlink(self):
+        retraits = [
+            {"courriel_id": courriel.id, "dossier_id": courriel.dossier_id.id}
+            for courriel in self if courriel.dossier_id
+        ]
+        result = super().unlink()
+        if retraits:
+            self.env["mail.courriel.retrait"].sudo().create(retraits)
+        return result
+
+    @api.model
+    def _version_synchro(self):
+        """Version globale des courriels, pour savoir si les compteurs des dossiers ont changé"""
+        self.env.flush_all()
+        self.env.cr.execute(f"SELECT max(write_date) FROM {self._table}")
+        dernier = self.env.cr.fetchone()[0]
+        dernier_retrait = self.env["mail.courriel.retrait"].sudo().search([], order="id desc", limit=1).id
+        return f"{fields.Datetime.to_string(dernier) or ''}|{dernier_retrait}"
+
+    @api.model
+    def _repere_synchro(self):
+        """
+        Début de la plus ancienne transaction ouverte sur la base.
+        write_date et create_date valent l'heure de début de la transaction
+        qui les écrit : toute modification pas encore validée portera une
+        date postérieure ou égale à ce repère, quelle que soit la durée de
+        sa transaction.
+        """
+        self.env.cr.execute("""
+            SELECT min(xact_start) AT TIME ZONE 'UTC'
+              FROM pg_stat_activity
+             WHERE datname = current_database()
+        """)
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def synchroniser(self, dossier_id, jeton=False, limit=100):
+        """
+        Synchronisation différentielle d'un dossier pour le client.
+        Retourne les courriels créés ou modifiés depuis le jeton, les
+        identifiants retirés du dossier (supprimés ou déplacés), le nombre
+        total de courriels du dossier et le nouveau jeton. Courriels et retraits sont lus depuis le même repère,
+        le début de la plus ancienne transaction ouverte (_repere_synchro).
+        Sans jeton valide, ou si les changements dépassent `limit`, renvoie
+        les derniers courriels avec reinitialiser=True.
+        """
+        maintenant = self.env.cr.now()
+        repere_suivant = self._repere_synchro()
+        # Lecture dans une transaction ouverte après le calcul du repère :
+        # ce qui a été validé entre-temps est visible, le reste est postérieur
+        # au repère et sera renvoyé à la prochaine synchronisation.
+        with self.env.registry.cursor() as cr:
+            return self.with_env(self.env(cr=cr))._synchroniser(
+                dossier_id, jeton, limit, maintenant, repere_suivant
+            )
+
+    @api.model
+    def _synchroniser(self, dossier_id, jeton, limit, maintenant, repere_suivant):
+        Retrait = self.env["mail.courriel.retrait"].sudo()
+        resultat = {
+            "jeton": "%s|%s" % (
+                fields.Datetime.to_string(maintenant),
+                fields.Datetime.to_string(repere_suivant),
+            ),
+            "version": self._version_synchro(),
+            "reinitialiser": True,
+            "total": self.search_count([("dossier_id", "=", dossier_id)]),
+            "courriels": [],
+            "retires": [],
+        }
+
+        emission = repere = None
+        if jeton:
+            try:
+                emission, repere = jeton.split("|")
+                emission = fields.Datetime.to_datetime(emission)
+                fields.Datetime.to_datetime(repere)
+            except ValueError:
+                emission = None
+
+        if emission and emission > maintenant - timedelta(days=RETENTION_RETRAITS):
+            courriels = self.search_read(
+                [("dossier_id", "=", dossier_id), ("write_date", ">=", repere)],
+                self.SYNCHRO_CHAMPS, limit=limit + 1
+            )
+            if len(courriels) <= limit:
+                retraits = Retrait.search_read(
+                    [("dossier_id", "=", dossier_id), ("create_date", ">=", repere)],
+                    ["courriel_id"]
+                )
+                resultat.update({
+                    "reinitialiser": False,
+                    "courriels": courriels,
+                    "retires": list({r["courriel_id"] for r in retraits}),
+                })
+                return resultat
+
+        resultat["courriels"] = self.search_read(
+            [("dossier_id", "=", dossier_id)], self.SYNCHRO_CHAMPS, limit=limit
+        )
+        return resultat
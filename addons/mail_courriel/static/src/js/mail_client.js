@@ -4,6 +4,16 @@ import { Component, useState, onWillStart } from "@odoo/owl";
 import { registry } from "@web/core/registry";
 import { useService } from "@web/core/utils/hooks";
 
+// Nombre maximum de courriels affichés par dossier
+const LIMITE_COURRIELS = 100;
+
+function compareCourriels(a, b) {
+    if (a.date_envoi !== b.date_envoi) {
+        return (a.date_envoi || "") < (b.date_envoi || "") ? 1 : -1;
+    }
+    return b.id - a.id;
+}
+
 export class MailCourrielClient extends Component {
     static template = "mail_courriel.MailCourrielClient";
     static props = ["*"];
@@ -29,6 +39,13 @@ export class MailCourrielClient extends Component {
             aiDraftResult: null,
         });
 
+        // Cache local : liste synchronisée de chaque dossier et contenus déjà ouverts
+        this.cache = {
+            dossiers: {},
+            contenus: {},
+            version: null,
+        };
+
         onWillStart(async () => {
             await this.loadDossiers();
             if (this.state.dossiers.length > 0) {
@@ -56,21 +73,72 @@ export class MailCourrielClient extends Component {
         this.state.selectedDossier = dossier;
         this.state.selectedCourriel = null;
         this.state.aiResult = null;
+        // Afficher immédiatement la version en cache, puis récupérer les changements
+        const entree = this.cache.dossiers[dossier.id];
+        this.state.courriels = entree ? entree.courriels : [];
+        await this.synchroniserDossier(dossier);
+    }
+
+    async synchroniserDossier(dossier) {
+        const entree = this.cache.dossiers[dossier.id] || { jeton: false, courriels: [] };
         try {
-            this.state.courriels = await this.orm.searchRead(
+            const result = await this.orm.call(
                 "mail.courriel",
-                [["dossier_id", "=", dossier.id]],
-                ["id", "name", "expediteur_id", "expediteur_email", "date_envoi", "statut", "priorite", "contenu", "is_entrant", "attachment_count"],
-                { order: "date_envoi desc", limit: 100 }
+                "synchroniser",
+                [dossier.id, entree.jeton],
+                { limit: LIMITE_COURRIELS }
             );
+            if (result.reinitialiser) {
+                entree.courriels = result.courriels;
+            } else if (result.courriels.length || result.retires.length) {
+                const remplaces = new Set([...result.retires, ...result.courriels.map(c => c.id)]);
+                entree.courriels = entree.courriels
+                    .filter(c => !remplaces.has(c.id))
+                    .concat(result.courriels)
+                    .sort(compareCourriels)
+                    .slice(0, LIMITE_COURRIELS);
+                // Des courriels ont quitté la liste : la recharger si le dossier en contient d'autres
+                if (entree.courriels.length < Math.min(result.total, LIMITE_COURRIELS)) {
+                    entree.jeton = false;
+                    this.cache.dossiers[dossier.id] = entree;
+                    return this.synchroniserDossier(dossier);
+                }
+            }
+            entree.jeton = result.jeton;
+            this.cache.dossiers[dossier.id] = entree;
+            if (this.state.selectedDossier && this.state.selectedDossier.id === dossier.id) {
+                this.state.courriels = entree.courriels;
+            }
+            // Recharger les compteurs des dossiers seulement si un courriel a changé
+            if (this.cache.version !== null && this.cache.version !== result.version) {
+                await this.loadDossiers();
+            }
+            this.cache.version = result.version;
         } catch (e) {
             console.error("Error loading emails:", e);
         }
     }
 
+    async loadContenu(courriel) {
+        // L'empreinte ne change qu'avec le contenu, pas avec le statut
+        const enCache = this.cache.contenus[courriel.id];
+        if (enCache && enCache.hash === courriel.contenu_hash) {
+            courriel.contenu = enCache.contenu;
+            return;
+        }
+        try {
+            const [record] = await this.orm.read("mail.courriel", [courriel.id], ["contenu"]);
+            this.cache.contenus[courriel.id] = { hash: courriel.contenu_hash, contenu: record.contenu };
+            courriel.contenu = record.contenu;
+        } catch (e) {
+            console.error("Error loading email content:", e);
+        }
+    }
+
     async selectCourriel(courriel) {
         this.state.selectedCourriel = courriel;
         this.state.aiResult = null;
+        await this.loadContenu(courriel);
         if (courriel.statut === 'envoye' && courriel.is_entrant) {
             try {
                 await this.orm.call("mail.courriel", "action_marquer_lu", [[courriel.id]]);
@@ -104,9 +172,10 @@ export class MailCourrielClient extends Component {
 
     async refreshEmails() {
         if (this.state.selectedDossier) {
-            await this.selectDossier(this.state.selectedDossier);
+            await this.synchroniserDossier(this.state.selectedDossier);
+        } else {
+            await this.loadDossiers();
         }
-        await this.loadDossiers();
     }
 
     // ============================================
@@ -369,15 +438,8 @@ export class MailCourrielClient extends Component {
         });
     }
 
-    stripHtml(html) {
-        if (!html) return "";
-        const tmp = document.createElement("div");
-        tmp.innerHTML = html;
-        return tmp.textContent || tmp.innerText || "";
-    }
-
-    getPreviewText(html, maxLength = 100) {
-        const text = this.stripHtml(html);
+    getPreviewText(text, maxLength = 100) {
+        if (!text) return "";
         return text.length > maxLength ? text.substring(0, maxLength) + "..." : text;
     }
 